@@ -1,6 +1,6 @@
 """Transformations in branch requires pytorch."""
 
-from typing import Callable, Literal
+from typing import Literal
 
 import numpy as np
 import numpy.typing as npt
@@ -16,8 +16,6 @@ class BranchToTensor(Transform[Branch, torch.Tensor]):
     channels: str
     channel_first: bool
 
-    get_channels: Callable[[Branch], npt.NDArray[np.float32]]
-
     def __init__(
         self, channels: Literal["xyz", "xyzr"] = "xyz", channel_first: bool = True
     ):
@@ -36,13 +34,8 @@ class BranchToTensor(Transform[Branch, torch.Tensor]):
         self.channels = channels
         self.channel_first = channel_first
 
-        match self.channels:
-            case "xyz":
-                self.get_channels = lambda x: x.xyz()
-            case "xyzr":
-                self.get_channels = lambda x: x.xyzr()
-            case _:
-                raise ValueError("unsupported channels.")
+        if self.channels not in ("xyz", "xyzr"):
+            raise ValueError("unsupported channels.")
 
     def __repr__(self) -> str:
         return f"BranchToTensor-{self.channels}{'-ChannelFirst' if self.channel_first else ''}"
@@ -51,3 +44,7 @@ class BranchToTensor(Transform[Branch, torch.Tensor]):
         channels = self.get_channels(x)  # (N, C)
         tensor = torch.from_numpy(channels).float()
         return tensor.T if self.channel_first else tensor
+
+    def get_channels(self, x: Branch) -> npt.NDArray[np.float32]:
+        """Get channels of branch, of shape (N, C)."""
+        return x.xyzr() if self.channels == "xyzr" else x.xyz()
@@ -1,20 +1,57 @@
 """Branch Dataset."""
 
+import hashlib
+import itertools
 import os
+import pickle
 import warnings
-from typing import Generic, Iterable, TypeVar, cast
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Generic, Iterable, TypeVar, cast
 
+import numpy as np
+import numpy.typing as npt
 import torch
 import torch.utils.data
-from tree_folder_dataset import TreeFolderDataset
+from tree_folder_dataset import TreeFolderDataset, _fast_read_swc
 
-from swcgeom import Branch
+from swcgeom.core import Branch, DictSWC, Tree
 from swcgeom.transforms import Identity, Transform
-from swcgeom.utils import numpy_err
 
 T = TypeVar("T")
 identity = Identity[Branch]()
 
+# process trees in parallel only if there are enough of them
+PARALLEL_THRESHOLD = 256
+
+
+@dataclass
+class JaggedBranches:
+    """Branches in a jagged layout.
+
+    Nodes of the i-th branch are `ndata[k][offsets[i] : offsets[i + 1]]`,
+    and its source is `sources[source_idx[i]]`.
+    """
+
+    ndata: dict[str, npt.NDArray]
+    offsets: npt.NDArray[np.int64]
+    sources: npt.NDArray[np.str_]
+    source_idx: npt.NDArray[np.int32]
+
+    def __getitem__(self, idx: int) -> Branch:
+        if not -len(self) <= idx < len(self):
+            raise IndexError(f"The index ({idx}) is out of range.")
+
+        idx = idx + len(self) if idx < 0 else idx
+        start, stop = self.offsets[idx], self.offsets[idx + 1]
+        ndata = {k: v[start:stop] for k, v in self.ndata.items()}
+        source = str(self.sources[self.source_idx[idx]])
+        attach = DictSWC(**ndata, source=source)
+        return Branch(attach, np.arange(stop - start, dtype=np.int32))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
 
 class BranchDataset(torch.utils.data.Dataset, Generic[T]):
     """An easy way to get branches."""
@@ -23,7 +60,14 @@ class BranchDataset(torch.utils.data.Dataset, Generic[T]):
     save: str | None
     transform: Transform[Branch, T]
 
-    branches: list[T]
+    _branches: list[T]
+
+    # Branches are saved in a jagged layout if transform emits `Branch`.
+    jagged: JaggedBranches | None
+
+    # Branches are stacked into one contiguous tensor if transform emits
+    # tensors of the same shape, e.g. resampled to a fixed length.
+    stack: torch.Tensor | None
 
     def __init__(
         self,
@@ -59,40 +103,226 @@ class BranchDataset(torch.utils.data.Dataset, Generic[T]):
         else:
             self.save = None
 
-        if self.save and os.path.exists(self.save):
-            self.branches = torch.load(self.save)
+        self._branches, self.jagged, self.stack = [], None, None
+        if self.save and self.load(self.save):
             return
 
-        self.branches = self.get_branches()
-        if self.save:
-            torch.save(self.branches, self.save)
+        branches = self.get_branches()
+        if _is_stackable(branches):
+            self.stack = torch.stack(cast(list[torch.Tensor], branches))
+            if self.save:
+                torch.save(self.stack, self.save)
+        elif self.save and _is_jaggable(branches):
+            self.to_jagged(cast(list[Branch], branches), self.save)
+            self.load(self.save)
+        else:
+            self._branches = branches
+            if self.save:
+                torch.save(self._branches, self.save)
 
     def __getitem__(self, idx: int) -> T:
         """Get branch."""
-        return self.branches[idx]
+        if self.jagged is not None:
+            return cast(T, self.jagged[idx])
+
+        if self.stack is not None:
+            return cast(T, self.stack[idx])
+
+        return self._branches[idx]
 
     def __len__(self) -> int:
         """Get length of branches."""
-        return len(self.branches)
+        if self.jagged is not None:
+            return len(self.jagged)
+
+        if self.stack is not None:
+            return self.stack.shape[0]
+
+        return len(self._branches)
+
+    @property
+    def branches(self) -> list[T]:
+        """Get all branches.
+
+        Branches saved in jagged or stacked are materialized on first
+        access and kept, prefer indexing the dataset to avoid it.
+        """
+        if len(self._branches) != len(self):
+            self._branches = [self[i] for i in range(len(self))]
+
+        return self._branches
 
     def get_filename(self) -> str:
-        """Get filename."""
-        trans_name = f"-{self.transform}" if self.transform is not identity else ""
-        return f"BranchDataset{trans_name}.pt"
+        """Get filename, keyed by a content hash of transform."""
+        if self.transform is identity:
+            return "BranchDataset.pt"
+
+        key = hashlib.blake2b(self.transform.cache_key(), digest_size=16)
+        return f"BranchDataset-{key.hexdigest()}.pt"
 
     def get_branches(self) -> list[T]:
-        """Get all branches."""
+        """Get all branches.
+
+        Trees are processed in parallel by a process pool if there are
+        many of them, more than one cpu is usable, and the transform can
+        be pickled.
+        """
         branches = list[T]()
+        dataset = TreeFolderDataset(self.swc_dir)
+        workers = _get_n_workers()
+        if (
+            len(dataset) < PARALLEL_THRESHOLD
+            or workers <= 1
+            or not _is_picklable(self.transform)
+        ):
+            for tree in dataset:
+                _extend_branches(branches, tree, self.transform)
 
-        with numpy_err(all="raise"):
-            for tree in TreeFolderDataset(self.swc_dir):
-                try:
-                    brs = tree.get_branches()
-                    brs = [self.transform(br) for br in brs] if self.transform else brs
-                    branches.extend(cast(Iterable[T], brs))
-                except Exception as ex:  # pylint: disable=broad-except
-                    warnings.warn(
-                        f"BranchDataset: skip swc '{tree.source}', got warning from numpy: {ex}"
-                    )
+            return branches
+
+        chunksize = max(1, min(64, len(dataset) // (4 * workers)))
+        with ProcessPoolExecutor(workers) as executor:
+            it = executor.map(
+                _get_branches,
+                dataset.swcs,
+                itertools.repeat(self.transform),
+                chunksize=chunksize,
+            )
+            for brs in it:
+                branches.extend(brs)
 
         return branches
+
+    def load(self, save: str) -> bool:
+        """Load branches from cache file, returns `False` if not exists."""
+        jagged = self.get_jagged_dirname(save)
+        offsets = os.path.join(jagged, "offsets.npy")
+        if os.path.exists(offsets):
+            ndata_dir = os.path.join(jagged, "ndata")
+            self.jagged = JaggedBranches(
+                ndata={
+                    # copy-on-write, so that branches can be modified in memory
+                    os.path.splitext(f)[0]: np.load(
+                        os.path.join(ndata_dir, f), mmap_mode="c"
+                    )
+                    for f in sorted(os.listdir(ndata_dir))
+                },
+                offsets=np.load(offsets),
+                sources=np.load(os.path.join(jagged, "sources.npy")),
+                source_idx=np.load(
+                    os.path.join(jagged, "source_idx.npy"), mmap_mode="r"
+                ),
+            )
+            return True
+
+        if os.path.exists(save):
+            data = torch.load(save)
+            if isinstance(data, torch.Tensor):
+                self.stack = data
+            else:
+                self._branches = data
+            return True
+
+        return False
+
+    @classmethod
+    def to_jagged(cls, branches: list[Branch], save: str) -> None:
+        """Save branches in a jagged layout.
+
+        Each column of nodes is concatenated into a memory-mapped `.npy`
+        file, with offsets of branches saved aside, so that types, ids
+        and extra columns survive. Sources are saved once per tree, with
+        the index of source of each branch.
+        """
+        lengths = [len(br) for br in branches]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        jagged = cls.get_jagged_dirname(save)
+        ndata_dir = os.path.join(jagged, "ndata")
+        os.makedirs(ndata_dir, exist_ok=True)
+        for k in branches[0].keys():
+            dtype = branches[0].get_ndata(k).dtype
+            column = np.lib.format.open_memmap(
+                os.path.join(ndata_dir, f"{k}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(offsets[-1].item(),),
+            )
+            for br, start, stop in zip(branches, offsets[:-1], offsets[1:]):
+                column[start:stop] = br.get_ndata(k)
+
+            column.flush()
+            del column
+
+        sources: dict[str, int] = {}
+        source_idx = np.array(
+            [sources.setdefault(br.attach.source, len(sources)) for br in branches],
+            dtype=np.int32,
+        )
+        np.save(os.path.join(jagged, "sources.npy"), np.array(list(sources), np.str_))
+        np.save(os.path.join(jagged, "source_idx.npy"), source_idx)
+        # offsets are written last, marking the cache as complete
+        np.save(os.path.join(jagged, "offsets.npy"), offsets)
+
+    @staticmethod
+    def get_jagged_dirname(save: str) -> str:
+        """Get directory name of jagged cache."""
+        return f"{save}.jagged"
+
+
+def _get_branches(swc: str, transform: Transform[Branch, T]) -> list[T]:
+    branches = list[T]()
+    _extend_branches(branches, _fast_read_swc(swc), transform)
+    return branches
+
+
+def _extend_branches(
+    branches: list[T], tree: Tree, transform: Transform[Branch, T]
+) -> None:
+    n_branches = len(branches)
+    try:
+        brs = tree.get_branches()
+        if isinstance(transform, Identity):  # `identity` is copied by pickle
+            branches.extend(cast(Iterable[T], brs))
+            return
+
+        # floating errors in transforms imply a corrupted swc
+        with np.errstate(all="raise"):
+            branches.extend(map(transform, brs))
+    except Exception as ex:  # pylint: disable=broad-except
+        del branches[n_branches:]  # drop the partial tree
+        warnings.warn(
+            f"BranchDataset: skip swc '{tree.source}', got warning from numpy: {ex}"
+        )
+
+
+def _is_jaggable(branches: list[Any]) -> bool:
+    if len(branches) == 0 or not isinstance(branches[0], Branch):
+        return False
+
+    keys = set(branches[0].keys())
+    return all(isinstance(br, Branch) and set(br.keys()) == keys for br in branches)
+
+
+def _is_stackable(branches: list[Any]) -> bool:
+    if len(branches) == 0 or not isinstance(branches[0], torch.Tensor):
+        return False
+
+    shape = branches[0].shape
+    return all(isinstance(br, torch.Tensor) and br.shape == shape for br in branches)
+
+
+def _is_picklable(obj: Any) -> bool:
+    try:
+        pickle.dumps(obj)
+        return True
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def _get_n_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects cpu affinity
+    except AttributeError:  # not available on macOS and Windows
+        return os.cpu_count() or 1
@@ -1,10 +1,18 @@
 """Tree Folder Dataset."""
 
-from typing import Generic, TypeVar, cast
+import json
+import os
+import warnings
+from typing import Dict, Generic, List, TypeVar, cast
 
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
 import torch.utils.data
 
 from swcgeom import Population, Tree
+from swcgeom.core.swc_utils import SWCNames, get_names, is_single_root
+from swcgeom.core.swc_utils.io import RE_COMMENT
 from swcgeom.transforms import Identity, Transform
 
 __all__ = ["TreeFolderDataset"]
@@ -16,13 +24,22 @@ identity = Identity[Tree]()
 class TreeFolderDataset(torch.utils.data.Dataset, Generic[T]):
     """Tree folder in swc format."""
 
-    population: Population
+    swcs: List[str]
     transform: Transform[Tree, T]
+    cache: str | None
+
+    # Columns of all trees are concatenated if cache is enabled, nodes
+    # of the i-th tree are `columns[k][offsets[i] : offsets[i + 1]]`.
+    columns: Dict[str, npt.NDArray] | None
+    offsets: npt.NDArray[np.int64] | None
+    # Trees failed to parse are not cached, and read again when accessed.
+    valid: npt.NDArray[np.bool_] | None
 
     def __init__(
         self,
         swc_dir: str,
         transform: Transform[Tree, T] = identity,
+        cache: str | bool = False,
     ) -> None:
         """Create tree dataset.
 
@@ -32,6 +49,11 @@ class TreeFolderDataset(torch.utils.data.Dataset, Generic[T]):
             Path of SWC file directory.
         transfroms : Transfroms[Tree, T], optional
             Branch transformations.
+        cache : Union[str, bool], default `False`
+            Store parsed trees as a column store in directory if not
+            False, so that we don't need to parse swc files again. If
+            `True`, automatically generate directory name. Comments of
+            trees are not cached.
 
         See Also
         --------
@@ -39,15 +61,256 @@ class TreeFolderDataset(torch.utils.data.Dataset, Generic[T]):
             Preset transform set.
         """
         super().__init__()
-        self.population = Population.from_swc(swc_dir)
+        if not os.path.exists(swc_dir):
+            raise FileNotFoundError(
+                f"the root does not refers to an existing directory: {swc_dir}"
+            )
+
+        self.swcs = self.find_swcs(swc_dir)
+        if len(self.swcs) == 0:
+            warnings.warn(f"no trees in population from '{swc_dir}'")
+
         self.transform = transform
 
+        if isinstance(cache, str):
+            self.cache = cache
+        elif cache:
+            self.cache = os.path.join(swc_dir, "TreeFolderDataset.cache")
+        else:
+            self.cache = None
+
+        self.columns, self.offsets, self.valid = None, None, None
+        if self.cache is not None:
+            if not self._load_cache(self.cache):
+                self._build_cache(self.cache)
+                self._load_cache(self.cache)
+
     def __getitem__(self, idx: int) -> T:
         """Get a tree."""
-        tree = self.population[idx]
+        if not -len(self) <= idx < len(self):
+            raise IndexError(f"The index ({idx}) is out of range.")
+
+        idx = idx + len(self) if idx < 0 else idx
+        if (
+            self.columns is not None
+            and self.offsets is not None
+            and self.valid is not None
+            and self.valid[idx]
+        ):
+            start, stop = self.offsets[idx], self.offsets[idx + 1]
+            ndata = {k: v[start:stop] for k, v in self.columns.items()}
+            source = os.path.abspath(self.swcs[idx])
+            tree = Tree(stop - start, **ndata, source=source)
+        else:
+            tree = _fast_read_swc(self.swcs[idx])
+
         x = self.transform(tree) if self.transform is not identity else tree
         return cast(T, x)
 
     def __len__(self) -> int:
         """Get length of set of trees."""
-        return len(self.population)
+        return len(self.swcs)
+
+    @staticmethod
+    def find_swcs(swc_dir: str, index: bool = False) -> List[str]:
+        """Find all swc files.
+
+        Parameters
+        ----------
+        swc_dir : str
+        index : bool, default `False`
+            Persist the result to `.swcs_index` in `swc_dir`, keyed by
+            modification time of all directories visited by the walk,
+            so that repeated runs skip the walk. Skipped if `swc_dir`
+            is not writable.
+
+        See Also
+        --------
+        ~swcgeom.Population.find_swcs
+        """
+        if not index:
+            return Population.find_swcs(swc_dir)
+
+        index_path = os.path.join(swc_dir, ".swcs_index")
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+
+            if all(_get_mtime(d) == t for d, t in cached["dirs"].items()):
+                return cached["swcs"]
+
+        dirs: List[str] = []
+        swcs = Population.find_swcs(swc_dir, visited=dirs)
+        try:
+            with open(index_path, "w", encoding="utf-8") as f:
+                # stat after the index is created in `swc_dir`
+                mtimes = {d: _get_mtime(d) for d in dirs}
+                json.dump({"dirs": mtimes, "swcs": swcs}, f)
+        except OSError:
+            pass  # read-only, e.g. mounted dataset
+
+        return swcs
+
+    def _build_cache(self, path: str) -> None:
+        """Parse all trees and write them to column store.
+
+        Trees are parsed twice, first for lengths, then to fill the
+        preallocated columns, so that only one tree is held in memory.
+        """
+        names = get_names()
+        stats = _get_stats(self.swcs)  # before parsing, so edits meanwhile are caught
+        lengths = np.zeros(len(self.swcs), dtype=np.int64)
+        valid = np.zeros(len(self.swcs), dtype=np.bool_)
+        dtypes: Dict[str, np.dtype] = {}
+        for i, swc in enumerate(self.swcs):
+            try:
+                tree = _fast_read_swc(swc)
+            except Exception as ex:  # pylint: disable=broad-except
+                warnings.warn(
+                    f"TreeFolderDataset: skip swc '{swc}' in cache, got: {ex}"
+                )
+                continue
+
+            lengths[i], valid[i] = len(tree), True
+            dtypes = dtypes or {k: tree.get_ndata(k).dtype for k in names.cols()}
+
+        offsets = np.zeros(len(self.swcs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        os.makedirs(path, exist_ok=True)
+        columns = {
+            k: np.lib.format.open_memmap(
+                os.path.join(path, f"{k}.npy"),
+                mode="w+",
+                dtype=dtypes.get(k, np.float32),
+                shape=(offsets[-1].item(),),
+            )
+            for k in names.cols()
+        }
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # reported in the first pass
+            for i in np.flatnonzero(valid):
+                tree = _fast_read_swc(self.swcs[i])
+                for k, column in columns.items():
+                    column[offsets[i] : offsets[i + 1]] = tree.get_ndata(k)
+
+        for column in columns.values():
+            column.flush()
+
+        del columns
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "valid.npy"), valid)
+        np.save(os.path.join(path, "stats.npy"), stats)
+        # swcs are written last, marking the cache as complete
+        np.save(os.path.join(path, "swcs.npy"), np.array(self.swcs, dtype=np.str_))
+
+    def _load_cache(self, path: str) -> bool:
+        """Load column store, returns `False` if missing or outdated."""
+        swcs_path = os.path.join(path, "swcs.npy")
+        if not os.path.exists(swcs_path):
+            return False
+
+        if np.load(swcs_path).tolist() != self.swcs:
+            return False
+
+        stats_path = os.path.join(path, "stats.npy")
+        if not os.path.exists(stats_path) or not np.array_equal(
+            np.load(stats_path), _get_stats(self.swcs)
+        ):
+            return False  # swc files are modified
+
+        names = get_names()
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.valid = np.load(os.path.join(path, "valid.npy"))
+        self.columns = {
+            # copy-on-write, so that trees can be modified in memory
+            k: np.load(os.path.join(path, f"{k}.npy"), mmap_mode="c")
+            for k in names.cols()
+        }
+        return True
+
+
+def _get_mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+def _get_stats(swcs: List[str]) -> npt.NDArray[np.int64]:
+    """Get modification time and size of files, shape (N, 2)."""
+    stats = np.full((len(swcs), 2), -1, dtype=np.int64)
+    for i, swc in enumerate(swcs):
+        try:
+            st = os.stat(swc)
+            stats[i] = st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            pass
+
+    return stats
+
+
+def _fast_read_swc(fname: str) -> Tree:
+    """Read swc file with the C tokenizer of numpy.
+
+    Only the seven standard columns are read, and node index is reset
+    to start with zero as `read_swc` does, with the same comments and
+    checks. Falls back to `Tree.from_swc` if the file can not be parsed
+    as a plain table.
+    """
+    names = get_names()
+    try:
+        with open(fname, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")  # empty file
+            data = np.loadtxt(lines, comments="#", usecols=range(7), ndmin=2)
+    except (ValueError, UserWarning, UnicodeDecodeError):
+        return Tree.from_swc(fname)
+
+    comments = _scan_lines(fname, lines, names)
+    ids, pids = data[:, 0].astype(np.int32), data[:, 6].astype(np.int32)
+    n_roots = np.count_nonzero(pids == -1)
+    root_loc = (pids == -1).argmax()
+    root_id = ids[root_loc]
+    ids, pids = ids - root_id, pids - root_id
+    pids[root_loc] = -1
+    ndata = {
+        names.id: ids,
+        names.type: data[:, 1].astype(np.int32),
+        names.x: data[:, 2],
+        names.y: data[:, 3],
+        names.z: data[:, 4],
+        names.r: data[:, 5],
+        names.pid: pids,
+    }
+
+    # check swc, same as `read_swc`
+    if n_roots != 1 or not is_single_root(pd.DataFrame(ndata), names=names):
+        warnings.warn(f"not a simple tree in `{fname}`")
+
+    if root_loc != 0:
+        warnings.warn(f"root is not the first node in `{fname}`")
+
+    if (ndata[names.r] <= 0).any():
+        warnings.warn(f"non-positive radius in `{fname}`")
+
+    source = os.path.abspath(fname)
+    return Tree(data.shape[0], **ndata, source=source, comments=comments, names=names)
+
+
+def _scan_lines(fname: str, lines: List[str], names: SWCNames) -> List[str]:
+    """Get comments, and warn on ignored fields as `read_swc` does."""
+    comments, flag = [], True
+    ignored_comment = f"# {' '.join(names.cols())}"
+    for i, line in enumerate(lines):
+        if match := RE_COMMENT.match(line):
+            comment = line[len(match.group(0)) :].removesuffix("\n")
+            if not comment.startswith(ignored_comment):
+                comments.append(comment)
+        elif flag and len(line.split("#", 1)[0].split()) > 7:
+            warnings.warn(f"some fields are ignored in row {i+1} of `{fname}`")
+            flag = False
+
+    return comments
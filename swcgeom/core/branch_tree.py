@@ -1,9 +1,10 @@
 """Branch tree is a simplified neuron tree."""
 
-import itertools
-from typing import Dict, List
+from functools import cached_property
+from typing import Dict, List, Tuple
 
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 from typing_extensions import Self
 
@@ -20,24 +21,33 @@ class BranchTree(Tree):
     A branch tree that contains only soma, branch, and tip nodes.
     """
 
-    branches: Dict[int, List[Branch]]
+    # Branches are stored in CSR layout, branches of the i-th node are
+    # `_branches[_branch_ptr[i] : _branch_ptr[i + 1]]`.
+    _branches: List[Branch]
+    _branch_ptr: npt.NDArray[np.int32]
+
+    @cached_property
+    def branches(self) -> Dict[int, List[Branch]]:
+        """Branches of original tree, keyed by node which they start from."""
+        starts = np.flatnonzero(np.diff(self._branch_ptr)).tolist()
+        return {idx: self.get_origin_node_branches(idx) for idx in starts}
 
     def get_origin_branches(self) -> List[Branch]:
         """Get branches of original tree."""
-        return list(itertools.chain(*self.branches.values()))
+        return self._branches
 
     def get_origin_node_branches(self, idx: int) -> List[Branch]:
         """Get branches of node of original tree."""
-        return self.branches[idx]
+        return self._branches[self._branch_ptr[idx] : self._branch_ptr[idx + 1]]
 
     @classmethod
     def from_tree(cls, tree: Tree) -> Self:
         """Generating a branch tree from tree."""
 
-        branches = tree.get_branches()
-
-        sub_id = np.array([0] + [br[-1].id for br in branches], dtype=np.int32)
-        sub_pid = np.array([-1] + [br[0].id for br in branches], dtype=np.int32)
+        # pylint: disable=too-many-locals
+        starts, ends, ptr, nodes = _split_branches(tree.pid(), tree.root_idx)
+        sub_id = np.concatenate([[tree.root_idx], ends]).astype(np.int32)
+        sub_pid = np.concatenate([[-1], starts]).astype(np.int32)
 
         (new_id, new_pid), id_map = to_sub_topology((sub_id, sub_pid))
 
@@ -47,15 +57,133 @@ class BranchTree(Tree):
 
         branch_tree = cls(n_nodes, **ndata, source=tree.source, names=tree.names)
 
-        branch_tree.branches = {}
-        for br in branches:
-            idx = np.nonzero(id_map == br[0].id)[0][0].item()
-            branch_tree.branches.setdefault(idx, [])
-            branch_tree.branches[idx].append(br.detach())
-
+        group_ptr, perm = _group_branches(starts, id_map)
+        branch_tree._branches = [
+            Tree.Branch(tree, nodes[ptr[i] : ptr[i + 1]]).detach() for i in perm
+        ]
+        branch_tree._branch_ptr = group_ptr
         return branch_tree
 
     @classmethod
     def from_data_frame(cls, df: pd.DataFrame, *args, **kwargs) -> Self:
         tree = super().from_data_frame(df, *args, **kwargs)
         return cls.from_tree(tree)
+
+
+def _split_branches(
+    pid: npt.NDArray[np.int32], root: int
+) -> Tuple[
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+]:
+    """Split tree into branches by node degree.
+
+    Nodes whose number of children is not one, and roots, are branch
+    points. Each branch starts from a branch point and ends at the next
+    one. Only the component of `root` is split, nodes connected to
+    other roots are ignored, same as traversing from `root`.
+
+    Returns
+    -------
+    starts : npt.NDArray[np.int64]
+        Start node of each branch, of shape (n_branches,).
+    ends : npt.NDArray[np.int64]
+        End node of each branch, of shape (n_branches,), sorted.
+    ptr : npt.NDArray[np.int64]
+        CSR pointer of shape (n_branches + 1,), nodes of the i-th branch
+        are `nodes[ptr[i] : ptr[i + 1]]`, ordered from start to end.
+    nodes : npt.NDArray[np.int64]
+    """
+
+    # pylint: disable=too-many-locals
+    n_nodes = pid.shape[0]
+    idx = np.arange(n_nodes)
+    is_root = pid == -1
+    parent = np.where(is_root, idx, pid)  # roots point to themselves
+    n_children = np.bincount(pid[~is_root], minlength=n_nodes)
+    is_key = (n_children != 1) | is_root
+    in_tree = _jump_to_key(parent, is_root) == root
+
+    ends = np.flatnonzero(is_key & ~is_root & in_tree)
+    starts = _jump_to_key(np.where(is_key, idx, parent), is_key)[parent[ends]]
+
+    # non-key nodes have exactly one child, follow it to the branch end
+    child = np.full(n_nodes, -1)
+    child[pid[~is_root]] = idx[~is_root]
+    top_down = _sort_by_depth(pid)  # parents before children
+    members = top_down[(~is_root & in_tree)[top_down]]
+    end_of = _jump_to_key(np.where(is_key, idx, child), is_key)[members]
+
+    end2branch = np.full(n_nodes, -1)
+    end2branch[ends] = np.arange(ends.shape[0])
+    branch_of = end2branch[end_of]
+    order = np.argsort(branch_of, kind="stable")  # keep start-to-end order
+
+    ptr = np.zeros(ends.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(branch_of, minlength=ends.shape[0]) + 1, out=ptr[1:])
+    is_start = np.zeros(ptr[-1], dtype=np.bool_)
+    is_start[ptr[:-1]] = True
+    nodes = np.empty(ptr[-1], dtype=np.int64)
+    nodes[is_start] = starts
+    nodes[~is_start] = members[order]
+    return starts, ends, ptr, nodes
+
+
+def _sort_by_depth(pid: npt.NDArray[np.int32]) -> npt.NDArray[np.int64]:
+    """Get nodes sorted by depth in ascending order.
+
+    This is a level order rather than a DFS order, parents always come
+    before children, so that top-down passes need no traversal.
+    """
+    idx = np.arange(pid.shape[0])
+    depth = _get_depth(np.where(pid == -1, idx, pid))
+    return np.argsort(depth, kind="stable")
+
+
+def _jump_to_key(
+    jump: npt.NDArray[np.int64], is_key: npt.NDArray[np.bool_]
+) -> npt.NDArray[np.int64]:
+    """Follow pointers until reaching key nodes, by pointer jumping.
+
+    Key nodes should point to themselves, it takes O(log depth) steps.
+    """
+    while not is_key[jump].all():
+        jump = jump[jump]
+
+    return jump
+
+
+def _get_depth(parent: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """Get depth of nodes by pointer jumping, roots point to themselves."""
+    jump = parent
+    depth = (parent != np.arange(parent.shape[0])).astype(np.int64)
+    while (parent[jump] != jump).any():
+        depth = depth + depth[jump]
+        jump = jump[jump]
+
+    return depth
+
+
+def _group_branches(
+    first_ids: npt.NDArray[np.int32], id_map: npt.NDArray[np.int32]
+) -> Tuple[npt.NDArray[np.int32], npt.NDArray[np.int64]]:
+    """Group branches by the node of branch tree they start from.
+
+    Returns
+    -------
+    ptr : npt.NDArray[np.int32]
+        CSR pointer of shape (n_nodes + 1,), branches starting from the
+        i-th node are `perm[ptr[i] : ptr[i + 1]]`.
+    perm : npt.NDArray[np.int64]
+        Indices of branches, sorted by the node they start from.
+    """
+    n_nodes = id_map.shape[0]
+    old2new = np.full(id_map.max() + 1, -1, dtype=np.int64)
+    old2new[id_map] = np.arange(n_nodes)
+    groups = old2new[first_ids]
+    perm = np.argsort(groups, kind="stable")
+    ptr = np.zeros(n_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(groups, minlength=n_nodes), out=ptr[1:])
+    return ptr, perm
@@ -177,13 +177,50 @@ class Population:
         return cls.from_swc(root, ext, extra_cols=extra_cols, **kwargs)
 
     @staticmethod
-    def find_swcs(root: str, ext: str = ".swc", relpath: bool = False) -> List[str]:
-        """Find all swc files."""
+    def find_swcs(
+        root: str,
+        ext: str = ".swc",
+        relpath: bool = False,
+        *,
+        visited: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Find all swc files.
+
+        Parameters
+        ----------
+        root : str
+        ext : str, default `.swc`
+        relpath : bool, default `False`
+            Return paths relative to `root`.
+        visited : List of str, optional
+            If provided, all directories visited by the walk are
+            appended to it, e.g. to detect changes by modification
+            time. Unreadable directories are skipped, same as
+            `os.walk`.
+        """
         swcs: List[str] = []
-        for r, _, files in os.walk(root):
-            rr = os.path.relpath(r, root) if relpath else r
-            fs = filter(lambda f: os.path.splitext(f)[-1] == ext, files)
-            swcs.extend(os.path.join(rr, f) for f in fs)
+        dirs = [root]
+        while len(dirs) != 0:  # dfs with top-down order, same as `os.walk`
+            d = dirs.pop()
+            if visited is not None:
+                visited.append(d)
+
+            try:
+                with os.scandir(d) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            dd = os.path.relpath(d, root) if relpath else d
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():  # `followlinks=False`
+                        subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[-1] == ext:
+                    swcs.append(os.path.join(dd, entry.name))
+
+            dirs.extend(reversed(subdirs))
 
         return swcs
 
@@ -200,6 +200,7 @@ class DictSWC(SWCLike):
     """SWC implementation on dict."""
 
     ndata: Dict[str, npt.NDArray]
+    _root_idx: int | None = None
 
     def __init__(
         self,
@@ -227,6 +228,35 @@ class DictSWC(SWCLike):
     def get_ndata(self, key: str) -> npt.NDArray[Any]:
         return self.ndata[key]
 
+    @property
+    def root_idx(self) -> int:
+        """Index of the first root node.
+
+        It is cached lazily, and recomputed once the cached node is no
+        longer a root.
+        """
+        pid = self.ndata[self.names.pid]
+        idx = self._root_idx
+        if idx is None or idx >= pid.shape[0] or pid[idx] != -1:
+            idx = self._root_idx = int((pid == -1).argmax())
+
+        return idx
+
     def copy(self) -> Self:
         """Make a copy."""
         return deepcopy(self)
+
+    def copy_with(self, **ndata: npt.NDArray) -> Self:
+        """Make a copy with some node data replaced.
+
+        Arrays in `ndata` are taken by reference, all other node data
+        and attributes are copied as `copy` does, so this skips copying
+        columns which would be thrown away.
+        """
+        memo = {id(self.ndata): {}}  # node data is copied below
+        new = deepcopy(self, memo)
+        new.ndata = {
+            k: ndata[k] if k in ndata else v.copy() for k, v in self.ndata.items()
+        }
+        new.ndata.update(ndata)
+        return new
@@ -1,6 +1,8 @@
 """Transformation in tree."""
 
+import json
 from abc import ABC, abstractmethod
+from dataclasses import asdict, is_dataclass
 from typing import Any, Generic, TypeVar, cast, overload
 
 __all__ = ["Transform", "Transforms", "Identity"]
@@ -26,6 +28,11 @@ class Transform(ABC, Generic[T, K]):
         Avoid using the underscore `_` because it is used by
         `Transforms`. If not provied, class name will be a default
         value.
+    cache_key() -> bytes
+        A stable identity of transform, used as the key of caches. It
+        is built from the instance attributes by default, subclasses
+        should overwrite it if parameters are not stored as attributes,
+        or attributes can not be encoded, e.g. callables.
     """
 
     @abstractmethod
@@ -36,6 +43,15 @@ class Transform(ABC, Generic[T, K]):
     def __repr__(self) -> str:
         return self.__class__.__name__
 
+    def cache_key(self) -> bytes:
+        """Get a canonical identity of transform."""
+        cls = type(self)
+        return json.dumps(
+            {"cls": f"{cls.__module__}.{cls.__qualname__}", "vars": vars(self)},
+            sort_keys=True,
+            default=_cache_key_default,
+        ).encode()
+
 
 class Transforms(Transform[T, K]):
     """A simple typed wrapper for transforms."""
@@ -89,6 +105,10 @@ class Transforms(Transform[T, K]):
     def __repr__(self) -> str:
         return "_".join([str(transform) for transform in self])
 
+    def cache_key(self) -> bytes:
+        keys = [t.cache_key().hex() for t in self.transforms]
+        return json.dumps({"cls": "Transforms", "transforms": keys}).encode()
+
     def __len__(self) -> int:
         return len(self.transforms)
 
@@ -101,3 +121,20 @@ class Identity(Transform[T, T]):
 
     def __repr__(self) -> str:
         return ""
+
+
+def _cache_key_default(o: Any) -> Any:
+    if isinstance(o, Transform):
+        return o.cache_key().hex()
+
+    if hasattr(o, "tolist"):  # numpy arrays and scalars
+        return o.tolist()
+
+    if is_dataclass(o) and not isinstance(o, type):  # e.g. names and types
+        return asdict(o)
+
+    # `repr` is not stable for most objects, e.g. lambdas
+    raise TypeError(
+        f"unable to build cache key from `{type(o).__name__}`, "
+        "overwrite `cache_key` of the transform"
+    )
@@ -1,5 +1,6 @@
 """SWC geometry operations."""
 
+import json
 import warnings
 from typing import Generic, Literal, Optional, TypeVar
 
@@ -50,13 +51,13 @@ class Normalizer(Generic[T], Transform[T, T]):
 
     def __call__(self, x: T) -> T:
         """Scale the `x`, `y`, `z`, `r` of nodes to 0-1."""
-        new_tree = x.copy()
         xyzr = [x.names.x, x.names.y, x.names.z, x.names.r]
-        for key in xyzr:  # TODO: does r is the same?
-            vs = new_tree.ndata[key]
-            new_tree.ndata[key] = (vs - np.min(vs)) / np.max(vs)
-
-        return new_tree
+        vs = np.stack([x.ndata[key] for key in xyzr])  # (4, N), rows are contiguous
+        lo, hi = vs.min(axis=1, keepdims=True), vs.max(axis=1, keepdims=True)
+        vs -= lo  # in-place, `vs` is already a fresh copy
+        vs /= np.where(hi > lo, hi - lo, 1)  # avoid zero division
+        # TODO: does r is the same?
+        return x.copy_with(**{key: vs[i] for i, key in enumerate(xyzr)})
 
 
 class RadiusReseter(Generic[T], Transform[T, T]):
@@ -68,15 +69,15 @@ class RadiusReseter(Generic[T], Transform[T, T]):
 
     def __call__(self, x: T) -> T:
         r = np.full_like(x.r(), fill_value=self.r)
-        new_tree = x.copy()
-        new_tree.ndata[new_tree.names.r] = r
-        return new_tree
+        return x.copy_with(**{x.names.r: r})
 
 
 class AffineTransform(Generic[T], Transform[T, T]):
     """Apply affine matrix."""
 
     tm: npt.NDArray[np.float32]
+    linear: npt.NDArray[np.float32]  # view of `tm[:3, :3]`
+    bias: npt.NDArray[np.float32]  # view of `tm[:3, 3]`
     center: Center
     fmt: str
 
@@ -89,6 +90,7 @@ class AffineTransform(Generic[T], Transform[T, T]):
         names: Optional[SWCNames] = None,
     ) -> None:
         self.tm, self.center, self.fmt = tm, center, fmt
+        self.linear, self.bias = tm[:3, :3], tm[:3, 3]
         if names is not None:
             warnings.warn(
                 "`name` parameter is no longer needed, now use the "
@@ -99,31 +101,81 @@ class AffineTransform(Generic[T], Transform[T, T]):
     def __call__(self, x: T) -> T:
         match self.center:
             case "root" | "soma":
-                idx = np.nonzero(x.ndata[x.names.pid] == -1)[0][0].item()
-                xyz = x.xyz()[idx]
-                tm = (
-                    translate3d(-xyz[0], -xyz[1], -xyz[2])
-                    .dot(self.tm)
-                    .dot(translate3d(xyz[0], xyz[1], xyz[2]))
-                )
+                idx = x.root_idx
+                bias = self._apply_center(x.x()[idx], x.y()[idx], x.z()[idx])
             case _:
-                tm = self.tm
+                bias = self.bias
 
-        return self.apply(x, tm)
+        return self._apply(x, self.linear, bias)
 
     def __repr__(self) -> str:
         return self.fmt
 
+    def cache_key(self) -> bytes:
+        cls = type(self)
+        return json.dumps(
+            {
+                "cls": f"{cls.__module__}.{cls.__qualname__}",
+                "tm": self.tm.tolist(),
+                "center": self.center,
+            }
+        ).encode()
+
+    def _apply_center(self, cx: float, cy: float, cz: float) -> npt.NDArray[np.float32]:
+        """Get the translation which applies `self.tm` around center.
+
+        Subclasses with known structure could overwrite it to patch only
+        the affected entries.
+        """
+        return _apply_centered(self.linear, self.bias, cx, cy, cz)
+
     @staticmethod
     def apply(x: T, tm: npt.NDArray[np.float32]) -> T:
-        xyzw = x.xyzw().dot(tm.T).T
-        xyzw /= xyzw[3]
+        """Apply affine matrix `tm` to `x`."""
+        return AffineTransform._apply(x, tm[:3, :3], tm[:3, 3])
+
+    @staticmethod
+    def _apply(
+        x: T, linear: npt.NDArray[np.float32], bias: npt.NDArray[np.float32]
+    ) -> T:
+        """Apply `linear @ xyz + bias` to `x`.
+
+        No homogeneous coordinate is materialized, and outputs are
+        written into a (3, N) buffer so that each coordinate is
+        contiguous.
+        """
+        xyz = np.stack([x.x(), x.y(), x.z()])  # (3, N)
+        out = np.empty_like(xyz, dtype=np.result_type(xyz, linear))
+        np.matmul(linear, xyz, out=out)
+        out += bias[:, None]
+
+        return _with_xyz(x, out)
 
-        y = x.copy()
-        y.ndata[x.names.x] = xyzw[0]
-        y.ndata[x.names.y] = xyzw[1]
-        y.ndata[x.names.z] = xyzw[2]
-        return y
+
+def _with_xyz(x: T, xyz: npt.NDArray[np.float32]) -> T:
+    names = x.names
+    return x.copy_with(**{names.x: xyz[0], names.y: xyz[1], names.z: xyz[2]})
+
+
+def _apply_centered(
+    linear: npt.NDArray[np.float32],
+    bias: npt.NDArray[np.float32],
+    cx: float,
+    cy: float,
+    cz: float,
+) -> npt.NDArray[np.float32]:
+    """Get the translation which applies affine transform around center.
+
+    This is the translation of `translate3d(c) @ tm @ translate3d(-c)`,
+    which is `bias + (I - linear) @ c`, so we don't need any 4x4 matmul.
+
+    Returns
+    -------
+    bias : np.NDArray
+        The translation, shape (3,).
+    """
+    c = np.array([cx, cy, cz], dtype=linear.dtype)
+    return bias + c - linear.dot(c)
 
 
 class Translate(Generic[T], AffineTransform[T]):
@@ -146,9 +198,8 @@ class TranslateOrigin(Generic[T], Transform[T, T]):
 
     @classmethod
     def transform(cls, x: T) -> T:
-        pid = np.nonzero(x.ndata[x.names.pid] == -1)[0][0].item()
-        xyzw = x.xyzw()
-        tm = translate3d(-xyzw[pid, 0], -xyzw[pid, 1], -xyzw[pid, 2])
+        idx = x.root_idx
+        tm = translate3d(-x.x()[idx], -x.y()[idx], -x.z()[idx])
         return AffineTransform.apply(x, tm)
 
 
@@ -161,6 +212,13 @@ class Scale(Generic[T], AffineTransform[T]):
         fmt = f"Scale-{sx}-{sy}-{sz}"
         super().__init__(scale3d(sx, sy, sz), center=center, fmt=fmt, **kwargs)
 
+    def _apply_center(self, cx: float, cy: float, cz: float) -> npt.NDArray[np.float32]:
+        bias = self.bias.copy()
+        bias[0] += cx - self.linear[0, 0] * cx
+        bias[1] += cy - self.linear[1, 1] * cy
+        bias[2] += cz - self.linear[2, 2] * cz
+        return bias
+
     @classmethod
     def transform(  # pylint: disable=too-many-arguments
         cls, x: T, sx: float, sy: float, sz: float, center: Center = "root", **kwargs
@@ -201,6 +259,13 @@ class RotateX(Generic[T], AffineTransform[T]):
             rotate3d_x(theta), center=center, fmt=f"RotateX-{theta}", **kwargs
         )
 
+    def _apply_center(self, cx: float, cy: float, cz: float) -> npt.NDArray[np.float32]:
+        bias = self.bias.copy()
+        c, s = self.linear[1, 1], self.linear[2, 1]
+        bias[1] += cy - c * cy + s * cz
+        bias[2] += cz - s * cy - c * cz
+        return bias
+
     @classmethod
     def transform(cls, x: T, theta: float, center: Center = "root", **kwargs) -> T:
         return cls(theta, center=center, **kwargs)(x)
@@ -211,9 +276,16 @@ class RotateY(Generic[T], AffineTransform[T]):
 
     def __init__(self, theta: float, center: Center = "root", **kwargs) -> None:
         super().__init__(
-            rotate3d_y(theta), center=center, fmt=f"RotateX-{theta}", **kwargs
+            rotate3d_y(theta), center=center, fmt=f"RotateY-{theta}", **kwargs
         )
 
+    def _apply_center(self, cx: float, cy: float, cz: float) -> npt.NDArray[np.float32]:
+        bias = self.bias.copy()
+        c, s = self.linear[0, 0], self.linear[0, 2]
+        bias[0] += cx - c * cx - s * cz
+        bias[2] += cz + s * cx - c * cz
+        return bias
+
     @classmethod
     def transform(cls, x: T, theta: float, center: Center = "root", **kwargs) -> T:
         return cls(theta, center=center, **kwargs)(x)
@@ -224,9 +296,16 @@ class RotateZ(Generic[T], AffineTransform[T]):
 
     def __init__(self, theta: float, center: Center = "root", **kwargs) -> None:
         super().__init__(
-            rotate3d_z(theta), center=center, fmt=f"RotateX-{theta}", **kwargs
+            rotate3d_z(theta), center=center, fmt=f"RotateZ-{theta}", **kwargs
         )
 
+    def _apply_center(self, cx: float, cy: float, cz: float) -> npt.NDArray[np.float32]:
+        bias = self.bias.copy()
+        c, s = self.linear[0, 0], self.linear[1, 0]
+        bias[0] += cx - c * cx + s * cy
+        bias[1] += cy - s * cx - c * cy
+        return bias
+
     @classmethod
     def transform(cls, x: T, theta: float, center: Center = "root", **kwargs) -> T:
         return cls(theta, center=center, **kwargs)(x)